@@ -8,15 +8,24 @@ FastAPI application providing:
 Architecture principle: Both HTTP and Voice use the SAME search_products function.
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from starlette.websockets import WebSocketState
+from starlette.concurrency import run_in_threadpool
 from typing import Optional
 import asyncio
+import gc
+import hashlib
+import json
 import os
+import ssl
 from dotenv import load_dotenv
 import logging
+import orjson
 
-from products import search_products, get_product_by_id, get_all_brands, get_all_categories, get_price_range
+from products import PRODUCTS, search_products_json, get_product_by_id, get_all_brands, get_all_categories, get_price_range
 from realtime_client import RealtimeClient
 
 # Load environment variables
@@ -33,23 +42,91 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Voice-Guided E-Commerce API",
     description="E-commerce backend with voice-controlled product search",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# CORS middleware - allow frontend to connect
+# CORS middleware - allow frontend to connect.
+# FRONTEND_ORIGIN accepts a comma-separated list of allowed origins.
+FRONTEND_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("FRONTEND_ORIGIN", "http://localhost:8010").split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, specify your frontend URL
+    allow_origins=FRONTEND_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type"],
+    max_age=86400,  # Let browsers cache preflight responses for 24h
 )
 
+# Compress JSON responses (product lists); WebSocket traffic is unaffected
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Get OpenAI API key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
+_VOICE_ENABLED = bool(OPENAI_API_KEY)
+if not _VOICE_ENABLED:
     logger.warning("OPENAI_API_KEY not found - voice features will be disabled")
 
+# Request guards for /api/products
+MAX_SEARCH_LIMIT = 100
+MAX_PRICE_FILTER = 10_000_000
+
+# Upper bound for a coalesced audio frame sent to the client
+MAX_AUDIO_FRAME_BYTES = 32_768
+
+# Per-connection cap on queued audio chunks (oldest dropped when full)
+AUDIO_QUEUE_MAXSIZE = 64
+
+# OpenAI/internal events forwarded to the frontend. High-frequency
+# response.audio_transcript.delta events are not forwarded: the frontend
+# ignores them and only displays the completed assistant_transcript.
+_FORWARD_EVENTS: frozenset = frozenset({
+    "clear_audio_queue",
+    "user_transcript",
+    "assistant_transcript",
+    "error"
+})
+
+# Fixed error sent to voice clients when no API key is configured
+_VOICE_DISABLED_MESSAGE = orjson.dumps({
+    "type": "error",
+    "error": {"message": "Voice features not configured - missing API key"}
+}).decode("utf-8")
+
+# Health check body never changes for the life of the process
+_HEALTH_BYTES = orjson.dumps({
+    "status": "healthy",
+    "service": "voice-ecommerce-api",
+    "voice_enabled": _VOICE_ENABLED
+})
+
+# The catalog is static per process, so its hash doubles as the metadata ETag
+_METADATA_ETAG = '"%s"' % hashlib.sha256(
+    json.dumps(PRODUCTS, sort_keys=True).encode("utf-8")
+).hexdigest()[:32]
+
+
+@app.on_event("startup")
+async def create_openai_ssl_context():
+    """Build the TLS context for OpenAI connections once, shared by all sessions"""
+    app.state.openai_ssl_context = ssl.create_default_context()
+
+
+@app.on_event("startup")
+async def freeze_static_objects():
+    """
+    Move the imported product catalog and indexes out of the GC's reach.
+
+    Each worker re-imports the (small, read-only) catalog, so there is
+    nothing worth sharing across processes; freezing avoids the cyclic GC
+    rescanning these long-lived objects on every collection.
+    """
+    gc.freeze()
+
 
 # =============================================================================
 # HTTP ENDPOINTS - Used by frontend UI filters
@@ -59,28 +136,33 @@ if not OPENAI_API_KEY:
 async def api_search_products(
     query: Optional[str] = Query(None, description="Search text"),
     category: Optional[str] = Query(None, description="Category filter"),
-    min_price: Optional[int] = Query(None, description="Minimum price"),
-    max_price: Optional[int] = Query(None, description="Maximum price"),
+    min_price: Optional[int] = Query(None, ge=0, le=MAX_PRICE_FILTER, description="Minimum price"),
+    max_price: Optional[int] = Query(None, ge=0, le=MAX_PRICE_FILTER, description="Maximum price"),
     brand: Optional[str] = Query(None, description="Brand filter"),
     sort_by: str = Query("relevance", description="Sort order"),
-    limit: int = Query(20, description="Max products to return")
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_LIMIT, description="Max products to return"),
+    only_in_stock: bool = Query(False, description="Only return products in stock")
 ):
     """
     Search and filter products.
 
     This endpoint uses the SAME search_products function as voice commands.
     This ensures consistent behavior between manual UI interaction and voice.
+    Runs in the threadpool so the event loop keeps serving voice audio, and
+    returns pre-serialized JSON cached per filter combination.
     """
-    result = search_products(
+    content = await run_in_threadpool(
+        search_products_json,
         query=query,
         category=category,
         min_price=min_price,
         max_price=max_price,
         brand=brand,
         sort_by=sort_by,
-        limit=limit
+        limit=limit,
+        only_in_stock=only_in_stock
     )
-    return result
+    return Response(content=content, media_type="application/json")
 
 
 @app.get("/api/products/{product_id}")
@@ -93,8 +175,12 @@ async def api_get_product(product_id: str):
 
 
 @app.get("/api/metadata")
-async def api_get_metadata():
-    """Get available filters metadata"""
+async def api_get_metadata(request: Request, response: Response):
+    """Get available filters metadata (cached, revalidated via ETag)"""
+    if request.headers.get("if-none-match") == _METADATA_ETAG:
+        return Response(status_code=304, headers={"ETag": _METADATA_ETAG})
+
+    response.headers["ETag"] = _METADATA_ETAG
     return {
         "categories": get_all_categories(),
         "brands": get_all_brands(),
@@ -104,18 +190,23 @@ async def api_get_metadata():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {
-        "status": "healthy",
-        "service": "voice-ecommerce-api",
-        "voice_enabled": bool(OPENAI_API_KEY)
-    }
+    """Health check endpoint (pre-serialized, hit frequently by load balancers)"""
+    return Response(content=_HEALTH_BYTES, media_type="application/json")
 
 
 # =============================================================================
 # WEBSOCKET ENDPOINT - Voice interactions
 # =============================================================================
 
+async def send_json_fast(websocket: WebSocket, data: dict):
+    """
+    Send a JSON event to the client, serialized with orjson.
+
+    Sent as a text frame: the frontend treats binary frames as audio.
+    """
+    await websocket.send_text(orjson.dumps(data).decode("utf-8"))
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """
@@ -131,23 +222,40 @@ async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     logger.info("Voice client connected")
 
-    if not OPENAI_API_KEY:
-        await websocket.send_json({
-            "type": "error",
-            "error": {"message": "Voice features not configured - missing API key"}
-        })
+    if not _VOICE_ENABLED:
+        await websocket.send_text(_VOICE_DISABLED_MESSAGE)
         await websocket.close()
         return
 
     # Create Realtime client
-    realtime_client = RealtimeClient(OPENAI_API_KEY)
+    realtime_client = RealtimeClient(
+        OPENAI_API_KEY,
+        ssl_context=websocket.app.state.openai_ssl_context
+    )
 
-    # Audio queue for sending to client
-    audio_queue = asyncio.Queue()
+    # Bounded audio queue for sending to client
+    audio_queue = asyncio.Queue(maxsize=AUDIO_QUEUE_MAXSIZE)
+    dropped_frames = 0
+
+    # Set once the client leaves so late OpenAI callbacks become no-ops
+    disconnected = asyncio.Event()
+
+    def queue_audio(audio_data: bytes):
+        """Queue without blocking, dropping the oldest chunk when full"""
+        nonlocal dropped_frames
+        try:
+            audio_queue.put_nowait(audio_data)
+        except asyncio.QueueFull:
+            audio_queue.get_nowait()
+            audio_queue.put_nowait(audio_data)
+            dropped_frames += 1
+            if dropped_frames % AUDIO_QUEUE_MAXSIZE == 1:
+                logger.warning("Client audio downlink stalled - dropped %d frames", dropped_frames)
 
     async def on_audio_delta(audio_data: bytes):
         """Handle audio chunks from OpenAI - queue for sending to client"""
-        await audio_queue.put(audio_data)
+        if not disconnected.is_set():
+            queue_audio(audio_data)
 
     async def on_event(event: dict):
         """
@@ -159,22 +267,15 @@ async def websocket_endpoint(websocket: WebSocket):
         - assistant_transcript: Show AI response text
         - error: Display errors
         """
-        event_type = event.get("type")
-
-        # Events to forward to frontend
-        forward_events = [
-            "clear_audio_queue",
-            "user_transcript",
-            "assistant_transcript",
-            "error",
-            "response.audio_transcript.delta"  # Real-time transcript
-        ]
-
-        if event_type in forward_events:
-            try:
-                await websocket.send_json(event)
-            except Exception as e:
-                logger.warning(f"Failed to send event to client: {e}")
+        if event.get("type") not in _FORWARD_EVENTS:
+            return
+        if websocket.client_state is not WebSocketState.CONNECTED:
+            return
+
+        try:
+            await send_json_fast(websocket, event)
+        except Exception as e:
+            logger.warning("Failed to send event to client: %s", e)
 
     async def on_ui_update(ui_event: dict):
         """
@@ -184,59 +285,56 @@ async def websocket_endpoint(websocket: WebSocket):
         result to the frontend so it can update the UI (show products,
         navigate, etc.)
         """
+        if websocket.client_state is not WebSocketState.CONNECTED:
+            return
+
         try:
-            await websocket.send_json(ui_event)
-            logger.info(f"UI update sent: {ui_event.get('action')}")
+            await send_json_fast(websocket, ui_event)
+            logger.info("UI update sent: %s", ui_event.get("action"))
         except Exception as e:
-            logger.warning(f"Failed to send UI update: {e}")
+            logger.warning("Failed to send UI update: %s", e)
 
     try:
         # Connect to OpenAI Realtime API
         await realtime_client.connect(on_audio_delta, on_event, on_ui_update)
 
-        # Task to send audio back to client
         async def send_audio_to_client():
-            while realtime_client.connected:
-                try:
-                    audio_data = await asyncio.wait_for(audio_queue.get(), timeout=0.1)
-                    await websocket.send_bytes(audio_data)
-                except asyncio.TimeoutError:
-                    continue
-                except Exception as e:
-                    logger.error(f"Error sending audio to client: {e}")
-                    break
-
-        # Start audio sender task
-        sender_task = asyncio.create_task(send_audio_to_client())
-
-        # Main loop - receive audio from client and forward to OpenAI
-        while True:
-            message = await websocket.receive()
-
-            if "bytes" in message:
-                # Audio data from client microphone
-                audio_data = message["bytes"]
-                await realtime_client.send_audio(audio_data)
-
-            elif "text" in message:
-                # JSON control messages (if needed for future extensions)
-                try:
-                    data = message["text"]
-                    logger.debug(f"Received text message: {data}")
-                except Exception:
-                    pass
-
-    except WebSocketDisconnect:
+            """Send queued OpenAI audio back to the client"""
+            while True:
+                audio_data = await audio_queue.get()
+
+                # Coalesce deltas already waiting into a single frame
+                while not audio_queue.empty() and len(audio_data) < MAX_AUDIO_FRAME_BYTES:
+                    audio_data += audio_queue.get_nowait()
+
+                await websocket.send_bytes(audio_data)
+
+        async def recv_from_client():
+            """Forward client microphone audio to OpenAI"""
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+
+                # Binary frames are mic audio; text frames are ignored
+                audio_data = message.get("bytes")
+                if audio_data:
+                    await realtime_client.send_audio(audio_data)
+
+        # Pump both directions; a failure in either cancels the other
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(send_audio_to_client())
+            tg.create_task(recv_from_client())
+
+    except* WebSocketDisconnect:
         logger.info("Voice client disconnected")
-    except Exception as e:
-        logger.error(f"WebSocket error: {e}")
+    except* Exception as eg:
+        for e in eg.exceptions:
+            logger.error("WebSocket error: %s", e)
     finally:
         # Cleanup
+        disconnected.set()
         await realtime_client.disconnect()
-        try:
-            sender_task.cancel()
-        except:
-            pass
         logger.info("Voice connection closed")
 
 
@@ -250,6 +348,9 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8005,
-        reload=True,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        workers=os.cpu_count(),
         log_level="info"
     )
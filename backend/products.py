@@ -4,14 +4,23 @@ This is the SINGLE SOURCE OF TRUTH for all product operations.
 Used by both HTTP API and voice commands.
 """
 
-from typing import Optional, List, Dict, Any
+import bisect
+import heapq
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple
+
+import orjson
 
 # =============================================================================
 # PRODUCT DATA
 # Realistic e-commerce products with Indian pricing
 # =============================================================================
 
-PRODUCTS: List[Dict[str, Any]] = [
+# Immutable catalog: the search indexes and caches below assume it never changes
+PRODUCTS: Tuple[Dict[str, Any], ...] = (
     # =========================================================================
     # MOBILES (12 products)
     # =========================================================================
@@ -645,7 +654,158 @@ PRODUCTS: List[Dict[str, Any]] = [
         "in_stock": True,
         "description": "Budget-friendly wireless headphones with good bass"
     }
-]
+)
+
+
+# =============================================================================
+# COLUMNAR INDEX
+# Structure-of-arrays view of PRODUCTS (position i is PRODUCTS[i]). Filters
+# are bitmasks over positions (bit i set = PRODUCTS[i] matches), so combining
+# category, brand, price and text filters is a handful of integer ANDs.
+# =============================================================================
+
+_PRICES: Tuple[int, ...] = tuple(p["price"] for p in PRODUCTS)
+_RATINGS: Tuple[float, ...] = tuple(p["rating"] for p in PRODUCTS)
+
+_ALL_MASK: int = (1 << len(PRODUCTS)) - 1
+
+
+def _build_masks(key: str) -> Dict[str, int]:
+    """Map each lower-cased value of a product field to its position bitmask"""
+    masks: Dict[str, int] = {}
+    for i, p in enumerate(PRODUCTS):
+        value = p[key].lower()
+        masks[value] = masks.get(value, 0) | (1 << i)
+    return masks
+
+
+_CATEGORY_MASKS: Dict[str, int] = _build_masks("category")
+_BRAND_MASKS: Dict[str, int] = _build_masks("brand")
+_IN_STOCK_MASK: int = sum(1 << i for i, p in enumerate(PRODUCTS) if p.get("in_stock", True))
+
+# Price index: sorted prices for bisect, and prefix masks where
+# _PRICE_PREFIX_MASKS[k] holds the k cheapest products, so any price range
+# [start, end) in sorted order is prefix[end] & ~prefix[start]
+_BY_PRICE: Tuple[int, ...] = tuple(sorted(range(len(PRODUCTS)), key=_PRICES.__getitem__))
+_PRICE_KEYS: Tuple[int, ...] = tuple(_PRICES[i] for i in _BY_PRICE)
+
+
+def _build_price_prefix_masks() -> Tuple[int, ...]:
+    """Cumulative position bitmasks in ascending price order"""
+    prefix = [0]
+    for i in _BY_PRICE:
+        prefix.append(prefix[-1] | (1 << i))
+    return tuple(prefix)
+
+
+_PRICE_PREFIX_MASKS: Tuple[int, ...] = _build_price_prefix_masks()
+
+# C-level sort keys over product positions
+_KEY_PRICE = _PRICES.__getitem__
+_KEY_RATING = _RATINGS.__getitem__
+
+# Product id -> product
+_BY_ID: Dict[str, Dict[str, Any]] = {p["id"]: p for p in PRODUCTS}
+
+# Filter metadata; the catalog is static so these never change
+_ALL_BRANDS: Tuple[str, ...] = tuple(sorted({p["brand"] for p in PRODUCTS}))
+_ALL_CATEGORIES: Tuple[str, ...] = tuple(sorted({p["category"] for p in PRODUCTS}))
+_PRICE_RANGE: Dict[str, int] = {"min": min(_PRICES), "max": max(_PRICES)}
+
+# Lower-cased text matched by the query filter, built once instead of per search
+_SEARCHABLE: Tuple[str, ...] = tuple(
+    f"{p['name']} {p['description']} {p['brand']} {p['category']}".lower()
+    for p in PRODUCTS
+)
+
+# Token index over the searchable text: word token -> position bitmask
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _build_token_index() -> Dict[str, int]:
+    """Map every word token in the searchable text to its position bitmask"""
+    index: Dict[str, int] = {}
+    for i, text in enumerate(_SEARCHABLE):
+        for token in _TOKEN_RE.findall(text):
+            index[token] = index.get(token, 0) | (1 << i)
+    return index
+
+
+_TOKEN_INDEX: Dict[str, int] = _build_token_index()
+
+
+@lru_cache(maxsize=1024)
+def _positions_containing(word: str) -> Optional[int]:
+    """
+    Resolve a query word to the bitmask of positions whose text contains it.
+
+    A word made only of word characters can't span a token boundary, so the
+    substring matches are exactly the union of the tokens that contain it.
+    Returns None for other words, which need a substring scan.
+    """
+    if not _TOKEN_RE.fullmatch(word):
+        return None
+    mask = 0
+    for token, token_mask in _TOKEN_INDEX.items():
+        if word in token:
+            mask |= token_mask
+    return mask
+
+
+def _matches_all_words(searchable: str, words: Tuple[str, ...]) -> bool:
+    """True if every query word occurs in the searchable text"""
+    return all(word in searchable for word in words)
+
+
+# BM25 relevance statistics (k1/b are the usual defaults). Term frequency and
+# document length are both counted in tokens; a query word "occurs" once per
+# token that contains it, matching how the query filter matches words.
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+_DOC_TOKEN_COUNTS: Tuple[Counter, ...] = tuple(Counter(_TOKEN_RE.findall(text)) for text in _SEARCHABLE)
+_DOC_LENGTHS: Tuple[int, ...] = tuple(sum(counts.values()) for counts in _DOC_TOKEN_COUNTS)
+_AVG_DOC_LENGTH: float = sum(_DOC_LENGTHS) / len(_DOC_LENGTHS)
+
+
+@lru_cache(maxsize=1024)
+def _term_frequencies(word: str) -> Dict[int, int]:
+    """Position -> term frequency of a query word, for positions where it occurs"""
+    if not _TOKEN_RE.fullmatch(word):
+        # Words with punctuation can span tokens, so count their occurrences
+        return {i: n for i, text in enumerate(_SEARCHABLE) if (n := text.count(word))}
+    tf: Dict[int, int] = {}
+    for token, token_mask in _TOKEN_INDEX.items():
+        if word in token:
+            for i in _iter_positions(token_mask):
+                tf[i] = tf.get(i, 0) + _DOC_TOKEN_COUNTS[i][token]
+    return tf
+
+
+@lru_cache(maxsize=1024)
+def _idf(word: str) -> float:
+    """BM25 inverse document frequency of a query word across the catalog"""
+    doc_freq = len(_term_frequencies(word))
+    n = len(_SEARCHABLE)
+    return math.log((n - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
+
+
+def _bm25(words: Tuple[str, ...], position: int) -> float:
+    """BM25 score of the product at `position` for the given query words"""
+    length_norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * _DOC_LENGTHS[position] / _AVG_DOC_LENGTH)
+    score = 0.0
+    for word in words:
+        tf = _term_frequencies(word).get(position, 0)
+        if tf:
+            score += _idf(word) * tf * (_BM25_K1 + 1) / (tf + length_norm)
+    return score
+
+
+def _iter_positions(mask: int):
+    """Yield the set bit positions of a mask in ascending (catalog) order"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
 
 
 # =============================================================================
@@ -654,18 +814,17 @@ PRODUCTS: List[Dict[str, Any]] = [
 
 def get_all_brands() -> List[str]:
     """Get unique list of all brands"""
-    return sorted(list(set(p["brand"] for p in PRODUCTS)))
+    return list(_ALL_BRANDS)
 
 
 def get_all_categories() -> List[str]:
     """Get unique list of all categories"""
-    return sorted(list(set(p["category"] for p in PRODUCTS)))
+    return list(_ALL_CATEGORIES)
 
 
 def get_price_range() -> Dict[str, int]:
-    """Get min and max price across all products"""
-    prices = [p["price"] for p in PRODUCTS]
-    return {"min": min(prices), "max": max(prices)}
+    """Get min and max price across all products (a copy of the cached range)"""
+    return dict(_PRICE_RANGE)
 
 
 # =============================================================================
@@ -679,7 +838,8 @@ def search_products(
     max_price: Optional[int] = None,
     brand: Optional[str] = None,
     sort_by: str = "relevance",
-    limit: int = 20
+    limit: int = 20,
+    only_in_stock: bool = False
 ) -> Dict[str, Any]:
     """
     Search and filter products.
@@ -698,88 +858,184 @@ def search_products(
         brand: Filter by brand name
         sort_by: Sort order (price_asc, price_desc, rating, relevance)
         limit: Maximum number of products to return
+        only_in_stock: Exclude products that are out of stock
 
     Returns:
         Dict with products, total count, applied filters, and metadata
     """
 
-    # Start with all products
-    filtered = PRODUCTS.copy()
     filters_applied = {}
 
-    # Apply category filter
-    if category:
-        category_lower = category.lower()
-        filtered = [p for p in filtered if p["category"].lower() == category_lower]
-        filters_applied["category"] = category_lower
+    # Normalize arguments so equivalent searches share a cache entry
+    category_lower = category.lower() if category else None
+    brand_lower = brand.lower() if brand else None
+    query_lower = query.lower() if query else None
+    min_price = int(min_price) if min_price is not None else None
+    max_price = int(max_price) if max_price is not None else None
 
-    # Apply brand filter
-    if brand:
-        brand_lower = brand.lower()
-        filtered = [p for p in filtered if p["brand"].lower() == brand_lower]
+    if category_lower:
+        filters_applied["category"] = category_lower
+    if brand_lower:
         filters_applied["brand"] = brand
-
-    # Apply price filters
     if min_price is not None:
-        filtered = [p for p in filtered if p["price"] >= min_price]
         filters_applied["min_price"] = min_price
-
     if max_price is not None:
-        filtered = [p for p in filtered if p["price"] <= max_price]
         filters_applied["max_price"] = max_price
-
-    # Apply text search
-    if query:
-        query_lower = query.lower()
-        query_words = query_lower.split()
-
-        def matches_query(product):
-            searchable = f"{product['name']} {product['description']} {product['brand']} {product['category']}".lower()
-            return all(word in searchable for word in query_words)
-
-        filtered = [p for p in filtered if matches_query(p)]
+    if query_lower:
         filters_applied["query"] = query
-
-    # Apply sorting
-    if sort_by == "price_asc":
-        filtered = sorted(filtered, key=lambda p: p["price"])
-    elif sort_by == "price_desc":
-        filtered = sorted(filtered, key=lambda p: p["price"], reverse=True)
-    elif sort_by == "rating":
-        filtered = sorted(filtered, key=lambda p: p["rating"], reverse=True)
-    # For "relevance", keep original order (or implement scoring)
-
+    if only_in_stock:
+        filters_applied["only_in_stock"] = True
     if sort_by != "relevance":
         filters_applied["sort_by"] = sort_by
 
-    # Get total before limiting
-    total = len(filtered)
-
-    # Apply limit
-    filtered = filtered[:limit]
+    products, total = _filter_products(
+        query_lower, category_lower, min_price, max_price, brand_lower, sort_by, limit,
+        bool(only_in_stock)
+    )
 
     return {
         "success": True,
         "data": {
-            "products": filtered,
+            "products": list(products),
             "total": total,
-            "returned": len(filtered),
+            "returned": len(products),
             "filters_applied": filters_applied
         },
+        # Brand/category tuples are immutable and shared; price_range is a
+        # per-response copy so callers can't corrupt the cached range
         "metadata": {
-            "available_categories": get_all_categories(),
-            "available_brands": get_all_brands(),
-            "price_range": get_price_range()
+            "available_categories": _ALL_CATEGORIES,
+            "available_brands": _ALL_BRANDS,
+            "price_range": dict(_PRICE_RANGE)
         }
     }
 
 
+@lru_cache(maxsize=512)
+def search_products_json(
+    query: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    brand: Optional[str] = None,
+    sort_by: str = "relevance",
+    limit: int = 20,
+    only_in_stock: bool = False
+) -> bytes:
+    """
+    Same as search_products, but returns the response as cached JSON bytes.
+
+    Used by the HTTP API so repeated filter combinations skip both the search
+    and the JSON serialization.
+    """
+    return orjson.dumps(search_products(
+        query=query,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        brand=brand,
+        sort_by=sort_by,
+        limit=limit,
+        only_in_stock=only_in_stock
+    ))
+
+
+@lru_cache(maxsize=512)
+def _filter_products(
+    query_lower: Optional[str],
+    category_lower: Optional[str],
+    min_price: Optional[int],
+    max_price: Optional[int],
+    brand_lower: Optional[str],
+    sort_by: str,
+    limit: int,
+    only_in_stock: bool
+) -> Tuple[Tuple[Dict[str, Any], ...], int]:
+    """
+    Filter, sort and limit the catalog for normalized search arguments.
+
+    Results are cached (the catalog is static per process) and returned as a
+    tuple so callers cannot mutate a cached entry.
+
+    Returns:
+        Tuple of (matching products up to limit, total matches before limit)
+    """
+
+    # Intersect the filter bitmasks; unknown categories/brands match nothing
+    mask = _ALL_MASK
+    if category_lower:
+        mask &= _CATEGORY_MASKS.get(category_lower, 0)
+    if brand_lower:
+        mask &= _BRAND_MASKS.get(brand_lower, 0)
+    if only_in_stock:
+        mask &= _IN_STOCK_MASK
+
+    # Price range -> contiguous slice of the price index -> prefix-mask difference
+    if min_price is not None or max_price is not None:
+        start = bisect.bisect_left(_PRICE_KEYS, min_price) if min_price is not None else 0
+        end = bisect.bisect_right(_PRICE_KEYS, max_price) if max_price is not None else len(_PRICE_KEYS)
+        mask &= _PRICE_PREFIX_MASKS[max(end, start)] & ~_PRICE_PREFIX_MASKS[start]
+
+    # Resolve query words through the token index; words it can't answer
+    # (containing punctuation) fall back to a substring scan
+    scan_words: Tuple[str, ...] = ()
+    if query_lower:
+        for word in query_lower.split():
+            if not mask:
+                # Nothing left to match; later words can't add results
+                break
+            word_mask = _positions_containing(word)
+            if word_mask is None:
+                scan_words += (word,)
+            else:
+                mask &= word_mask
+
+    indices = list(_iter_positions(mask))
+    if scan_words:
+        indices = [i for i in indices if _matches_all_words(_SEARCHABLE[i], scan_words)]
+
+    # Sort and limit product positions using the columns, so product dicts
+    # are only touched for the results actually returned
+    total = len(indices)
+
+    # Apply sorting. When only the top `limit` results are returned, select
+    # them with a heap (O(N log limit)) instead of sorting everything; both
+    # paths are stable, so ties keep catalog order.
+    partial = limit < total
+    if sort_by == "price_asc":
+        if partial:
+            indices = heapq.nsmallest(limit, indices, key=_KEY_PRICE)
+        else:
+            indices.sort(key=_KEY_PRICE)
+    elif sort_by == "price_desc":
+        if partial:
+            indices = heapq.nlargest(limit, indices, key=_KEY_PRICE)
+        else:
+            indices.sort(key=_KEY_PRICE, reverse=True)
+    elif sort_by == "rating":
+        if partial:
+            indices = heapq.nlargest(limit, indices, key=_KEY_RATING)
+        else:
+            indices.sort(key=_KEY_RATING, reverse=True)
+    elif sort_by == "relevance" and query_lower:
+        # Rank text searches by BM25 score; without a query keep catalog order
+        query_words = tuple(query_lower.split())
+
+        def key(i: int) -> float:
+            return _bm25(query_words, i)
+
+        if partial:
+            indices = heapq.nlargest(limit, indices, key=key)
+        else:
+            indices.sort(key=key, reverse=True)
+
+    # Apply limit, materializing only the returned products
+    return tuple(PRODUCTS[i] for i in indices[:limit]), total
+
+
 def get_product_by_id(product_id: str) -> Optional[Dict[str, Any]]:
     """Get a single product by ID"""
-    for product in PRODUCTS:
-        if product["id"] == product_id:
-            return product
-    return None
+    return _BY_ID.get(product_id)
 
 
 def get_product_by_index(products: List[Dict], index: int) -> Optional[Dict[str, Any]]:
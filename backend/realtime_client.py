@@ -9,27 +9,139 @@ This client handles:
 """
 
 import asyncio
+import ssl
 import websockets
-import json
-import base64
+import orjson
+import pybase64
 from typing import Optional, Callable, Dict, Any
 import logging
-from tools import TOOLS, FUNCTION_MAP, reset_session_state
+from tools import TOOLS, FUNCTION_MAP, FUNCTION_ARGS, SessionState
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# =============================================================================
+# STATIC SESSION MESSAGES
+# Identical for every connection, so they're serialized once at import
+# =============================================================================
+
+_SESSION_CONFIG = {
+    "type": "session.update",
+    "session": {
+        "modalities": ["text", "audio"],
+        "instructions": """You are BitBot, the helpful voice assistant for BitComm - a voice-guided e-commerce store by Bitcot.
+
+CRITICAL RULES:
+1. ALWAYS speak in clear, concise ENGLISH.
+2. Use the appropriate function for each request:
+   - search_products: Find and filter products
+   - get_product_details: Show specs/details popup for a product
+   - compare_products: Compare 2+ products side by side
+   - add_to_cart: Add product to shopping cart
+   - navigate_to_page: Go to different pages (home, products, cart, checkout)
+
+VOICE INTERACTION GUIDELINES:
+1. Be conversational but efficient - users want quick results.
+2. After showing products, briefly summarize: "I found X products..."
+3. Use natural price formatting: "fifteen thousand rupees" not "15000 INR"
+4. When users say "under 10k", interpret as max_price: 10000
+5. Products are numbered #1, #2, #3 etc. Use position numbers for references.
+
+EXAMPLE INTERACTIONS:
+- "Show me mobile phones" → search_products(category: "mobiles")
+- "Laptops under 50000" → search_products(category: "laptops", max_price: 50000)
+- "Filter by Samsung" → search_products(brand: "Samsung")
+- "Tell me about the first one" → get_product_details(position: 1)
+- "What are the specs of second product" → get_product_details(position: 2)
+- "Compare first and third" → compare_products(positions: [1, 3])
+- "Add the first one to cart" → add_to_cart(position: 1)
+- "Go to cart" → navigate_to_page(page: "cart")
+- "Checkout" → navigate_to_page(page: "checkout")
+
+RESPONSE FORMAT:
+- After search: "I found X products. Here are the top options..."
+- After details: "Here are the specifications for [product name]..."
+- After compare: "I'm showing you a comparison of these products..."
+- After add to cart: "Done! I've added [product] to your cart..."
+- After navigation: "Taking you to [page]..."
+
+Remember: The UI automatically updates when you call functions. Focus on helpful voice narration.""",
+        "voice": "sage",
+        "input_audio_format": "pcm16",
+        "output_audio_format": "pcm16",
+        "input_audio_transcription": {
+            "model": "whisper-1"
+        },
+        "turn_detection": {
+            "type": "server_vad",
+            "threshold": 0.5,
+            "prefix_padding_ms": 300,
+            "silence_duration_ms": 600
+        },
+        "tools": TOOLS,
+        "tool_choice": "auto",
+        "temperature": 0.7
+    }
+}
+
+_GREETING_EVENT = {
+    "type": "response.create",
+    "response": {
+        "modalities": ["text", "audio"],
+        "instructions": """Greet the user warmly and briefly. Say something like:
+"Hi! I'm BitBot, your shopping assistant at BitComm. You can ask me to find products, filter by category or price, or get details about any item. What are you looking for today?"
+Keep it under 10 seconds."""
+    }
+}
+
+_SESSION_UPDATE_FRAME = orjson.dumps(_SESSION_CONFIG).decode()
+_GREETING_FRAME = orjson.dumps(_GREETING_EVENT).decode()
+_RESPONSE_CREATE_FRAME = orjson.dumps({"type": "response.create"}).decode()
+
+# input_audio_buffer.append is sent for every mic chunk. Base64 never needs
+# JSON escaping, so the frame is assembled directly around the encoded audio.
+_AUDIO_APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+_AUDIO_APPEND_SUFFIX = '"}'
+
+
+def _function_output_frame(call_id: Optional[str], result: Dict[str, Any]) -> str:
+    """
+    conversation.item.create frame carrying a function result.
+
+    The API takes `output` as a JSON string, so the result is serialized once
+    and spliced into a fixed envelope rather than wrapped in a dict that gets
+    serialized again.
+    """
+    output = orjson.dumps(orjson.dumps(result).decode()).decode()
+    return (
+        '{"type":"conversation.item.create","item":{"type":"function_call_output","call_id":'
+        + orjson.dumps(call_id).decode()
+        + ',"output":'
+        + output
+        + "}}"
+    )
+
 
 class RealtimeClient:
     """Client for OpenAI Realtime API with UI event support"""
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, ssl_context: Optional[ssl.SSLContext] = None):
+        """
+        Args:
+            api_key: OpenAI API key
+            ssl_context: Shared TLS context for the upstream connection, so
+                CA certificates aren't reloaded on every connect
+        """
         self.api_key = api_key
+        self.ssl_context = ssl_context
         self.model = "gpt-realtime-mini-2025-12-15"
         self.url = f"wss://api.openai.com/v1/realtime?model={self.model}"
         self.ws: Optional[websockets.WebSocketClientProtocol] = None
         self.connected = False
 
+        # Last shown products for this connection's follow-up queries
+        self.session_state = SessionState()
+
         # Interruption tracking
         self.current_response_id = None
         self.audio_samples_sent = 0
@@ -37,6 +149,17 @@ class RealtimeClient:
         # Callback for sending UI updates to frontend
         self._on_ui_update: Optional[Callable] = None
 
+        # Event type -> handler, so each frame costs one dict lookup
+        self._event_handlers: Dict[str, Callable] = {
+            "response.audio.delta": self._on_audio_delta_event,
+            "input_audio_buffer.speech_started": self._on_speech_started,
+            "response.audio.done": self._on_audio_done,
+            "response.function_call_arguments.done": self._on_function_call_done,
+            "conversation.item.input_audio_transcription.completed": self._on_user_transcript,
+            "response.audio_transcript.done": self._on_assistant_transcript,
+            "error": self._on_error_event,
+        }
+
     async def connect(
         self,
         on_audio_delta: Callable,
@@ -59,10 +182,11 @@ class RealtimeClient:
                 "OpenAI-Beta": "realtime=v1"
             }
 
-            logger.info(f"Connecting to OpenAI Realtime API: {self.url}")
+            logger.info("Connecting to OpenAI Realtime API: %s", self.url)
             self.ws = await websockets.connect(
                 self.url,
                 extra_headers=headers,
+                ssl=self.ssl_context or True,
                 ping_interval=20,
                 ping_timeout=10
             )
@@ -71,7 +195,7 @@ class RealtimeClient:
             logger.info("Connected to OpenAI Realtime API")
 
             # Reset session state for new connection
-            reset_session_state()
+            self.session_state.clear()
 
             # Configure session
             await self.configure_session()
@@ -83,89 +207,19 @@ class RealtimeClient:
             await self.send_initial_greeting()
 
         except Exception as e:
-            logger.error(f"Connection error: {e}")
+            logger.error("Connection error: %s", e)
             self.connected = False
             raise
 
     async def configure_session(self):
         """Configure the Realtime API session for e-commerce voice assistant"""
-        session_config = {
-            "type": "session.update",
-            "session": {
-                "modalities": ["text", "audio"],
-                "instructions": """You are BitBot, the helpful voice assistant for BitComm - a voice-guided e-commerce store by Bitcot.
-
-CRITICAL RULES:
-1. ALWAYS speak in clear, concise ENGLISH.
-2. Use the appropriate function for each request:
-   - search_products: Find and filter products
-   - get_product_details: Show specs/details popup for a product
-   - compare_products: Compare 2+ products side by side
-   - add_to_cart: Add product to shopping cart
-   - navigate_to_page: Go to different pages (home, products, cart, checkout)
-
-VOICE INTERACTION GUIDELINES:
-1. Be conversational but efficient - users want quick results.
-2. After showing products, briefly summarize: "I found X products..."
-3. Use natural price formatting: "fifteen thousand rupees" not "15000 INR"
-4. When users say "under 10k", interpret as max_price: 10000
-5. Products are numbered #1, #2, #3 etc. Use position numbers for references.
-
-EXAMPLE INTERACTIONS:
-- "Show me mobile phones" → search_products(category: "mobiles")
-- "Laptops under 50000" → search_products(category: "laptops", max_price: 50000)
-- "Filter by Samsung" → search_products(brand: "Samsung")
-- "Tell me about the first one" → get_product_details(position: 1)
-- "What are the specs of second product" → get_product_details(position: 2)
-- "Compare first and third" → compare_products(positions: [1, 3])
-- "Add the first one to cart" → add_to_cart(position: 1)
-- "Go to cart" → navigate_to_page(page: "cart")
-- "Checkout" → navigate_to_page(page: "checkout")
-
-RESPONSE FORMAT:
-- After search: "I found X products. Here are the top options..."
-- After details: "Here are the specifications for [product name]..."
-- After compare: "I'm showing you a comparison of these products..."
-- After add to cart: "Done! I've added [product] to your cart..."
-- After navigation: "Taking you to [page]..."
-
-Remember: The UI automatically updates when you call functions. Focus on helpful voice narration.""",
-                "voice": "sage",
-                "input_audio_format": "pcm16",
-                "output_audio_format": "pcm16",
-                "input_audio_transcription": {
-                    "model": "whisper-1"
-                },
-                "turn_detection": {
-                    "type": "server_vad",
-                    "threshold": 0.5,
-                    "prefix_padding_ms": 300,
-                    "silence_duration_ms": 600
-                },
-                "tools": TOOLS,
-                "tool_choice": "auto",
-                "temperature": 0.7
-            }
-        }
-
-        await self.ws.send(json.dumps(session_config))
+        await self.ws.send(_SESSION_UPDATE_FRAME)
         logger.info("Session configured for e-commerce assistant")
 
     async def send_initial_greeting(self):
         """Trigger the assistant to greet the user"""
         await asyncio.sleep(0.5)
-
-        greeting_event = {
-            "type": "response.create",
-            "response": {
-                "modalities": ["text", "audio"],
-                "instructions": """Greet the user warmly and briefly. Say something like:
-"Hi! I'm BitBot, your shopping assistant at BitComm. You can ask me to find products, filter by category or price, or get details about any item. What are you looking for today?"
-Keep it under 10 seconds."""
-            }
-        }
-
-        await self.ws.send(json.dumps(greeting_event))
+        await self.ws.send(_GREETING_FRAME)
         logger.info("Initial greeting triggered")
 
     async def send_audio(self, audio_data: bytes):
@@ -174,103 +228,22 @@ Keep it under 10 seconds."""
             return
 
         try:
-            audio_event = {
-                "type": "input_audio_buffer.append",
-                "audio": base64.b64encode(audio_data).decode('utf-8')
-            }
-            await self.ws.send(json.dumps(audio_event))
+            await self.ws.send(
+                _AUDIO_APPEND_PREFIX + pybase64.b64encode_as_string(audio_data) + _AUDIO_APPEND_SUFFIX
+            )
         except Exception as e:
-            logger.error(f"Error sending audio: {e}")
+            logger.error("Error sending audio: %s", e)
 
     async def _listen_events(self, on_audio_delta: Callable, on_event: Callable):
         """Listen for events from OpenAI Realtime API"""
+        handlers = self._event_handlers
         try:
             async for message in self.ws:
-                event = json.loads(message)
-                event_type = event.get("type")
-
-                # =============================================================
-                # AUDIO RESPONSE HANDLING
-                # =============================================================
-                if event_type == "response.audio.delta":
-                    item_id = event.get("item_id")
-                    if item_id:
-                        self.current_response_id = item_id
-
-                    audio_data = event.get("delta")
-                    if audio_data:
-                        decoded_audio = base64.b64decode(audio_data)
-                        self.audio_samples_sent += len(decoded_audio) // 2
-                        await on_audio_delta(decoded_audio)
-
-                # =============================================================
-                # INTERRUPTION HANDLING
-                # =============================================================
-                elif event_type == "input_audio_buffer.speech_started":
-                    logger.info("User interrupting - truncating response")
-
-                    if self.current_response_id:
-                        audio_end_ms = self.audio_samples_sent // 24
-
-                        truncate_event = {
-                            "type": "conversation.item.truncate",
-                            "item_id": self.current_response_id,
-                            "content_index": 0,
-                            "audio_end_ms": audio_end_ms
-                        }
-
-                        await self.ws.send(json.dumps(truncate_event))
-                        logger.info(f"Truncated at {audio_end_ms}ms")
-
-                        self.current_response_id = None
-                        self.audio_samples_sent = 0
-
-                    # Signal frontend to clear audio queue
-                    await on_event({"type": "clear_audio_queue"})
-
-                # =============================================================
-                # RESPONSE COMPLETE
-                # =============================================================
-                elif event_type == "response.audio.done":
-                    self.current_response_id = None
-                    self.audio_samples_sent = 0
-
-                # =============================================================
-                # FUNCTION CALLING - THE KEY PART
-                # =============================================================
-                elif event_type == "response.function_call_arguments.done":
-                    await self._handle_function_call(event, on_event)
-
-                # =============================================================
-                # TRANSCRIPT EVENTS (for UI display)
-                # =============================================================
-                elif event_type == "conversation.item.input_audio_transcription.completed":
-                    transcript = event.get("transcript", "")
-                    logger.info(f"User: {transcript}")
-                    # Send to frontend for display
-                    await on_event({
-                        "type": "user_transcript",
-                        "transcript": transcript
-                    })
-
-                elif event_type == "response.audio_transcript.done":
-                    transcript = event.get("transcript", "")
-                    logger.info(f"Assistant: {transcript}")
-                    # Send to frontend for display
-                    await on_event({
-                        "type": "assistant_transcript",
-                        "transcript": transcript
-                    })
-
-                # =============================================================
-                # ERROR HANDLING
-                # =============================================================
-                elif event_type == "error":
-                    logger.error(f"OpenAI API Error: {event}")
-                    await on_event({
-                        "type": "error",
-                        "error": event.get("error", {})
-                    })
+                event = orjson.loads(message)
+
+                handler = handlers.get(event.get("type"))
+                if handler:
+                    await handler(event, on_audio_delta, on_event)
 
                 # Forward all events to handler
                 await on_event(event)
@@ -279,9 +252,98 @@ Keep it under 10 seconds."""
             logger.info("WebSocket connection closed")
             self.connected = False
         except Exception as e:
-            logger.error(f"Error in event listener: {e}")
+            logger.error("Error in event listener: %s", e)
             self.connected = False
 
+    # =========================================================================
+    # AUDIO RESPONSE HANDLING
+    # =========================================================================
+
+    async def _on_audio_delta_event(self, event: Dict[str, Any], on_audio_delta: Callable, on_event: Callable):  # noqa: ARG002
+        item_id = event.get("item_id")
+        if item_id:
+            self.current_response_id = item_id
+
+        audio_data = event.get("delta")
+        if audio_data:
+            decoded_audio = pybase64.b64decode(audio_data)
+            self.audio_samples_sent += len(decoded_audio) // 2
+            await on_audio_delta(decoded_audio)
+
+    # =========================================================================
+    # INTERRUPTION HANDLING
+    # =========================================================================
+
+    async def _on_speech_started(self, event: Dict[str, Any], on_audio_delta: Callable, on_event: Callable):  # noqa: ARG002
+        logger.info("User interrupting - truncating response")
+
+        if self.current_response_id:
+            audio_end_ms = self.audio_samples_sent // 24
+
+            truncate_event = {
+                "type": "conversation.item.truncate",
+                "item_id": self.current_response_id,
+                "content_index": 0,
+                "audio_end_ms": audio_end_ms
+            }
+
+            await self.ws.send(orjson.dumps(truncate_event).decode())
+            logger.info("Truncated at %dms", audio_end_ms)
+
+            self.current_response_id = None
+            self.audio_samples_sent = 0
+
+        # Signal frontend to clear audio queue
+        await on_event({"type": "clear_audio_queue"})
+
+    # =========================================================================
+    # RESPONSE COMPLETE
+    # =========================================================================
+
+    async def _on_audio_done(self, event: Dict[str, Any], on_audio_delta: Callable, on_event: Callable):  # noqa: ARG002
+        self.current_response_id = None
+        self.audio_samples_sent = 0
+
+    # =========================================================================
+    # FUNCTION CALLING - THE KEY PART
+    # =========================================================================
+
+    async def _on_function_call_done(self, event: Dict[str, Any], on_audio_delta: Callable, on_event: Callable):  # noqa: ARG002
+        await self._handle_function_call(event, on_event)
+
+    # =========================================================================
+    # TRANSCRIPT EVENTS (for UI display)
+    # =========================================================================
+
+    async def _on_user_transcript(self, event: Dict[str, Any], on_audio_delta: Callable, on_event: Callable):  # noqa: ARG002
+        transcript = event.get("transcript", "")
+        logger.info("User: %s", transcript)
+        # Send to frontend for display
+        await on_event({
+            "type": "user_transcript",
+            "transcript": transcript
+        })
+
+    async def _on_assistant_transcript(self, event: Dict[str, Any], on_audio_delta: Callable, on_event: Callable):  # noqa: ARG002
+        transcript = event.get("transcript", "")
+        logger.info("Assistant: %s", transcript)
+        # Send to frontend for display
+        await on_event({
+            "type": "assistant_transcript",
+            "transcript": transcript
+        })
+
+    # =========================================================================
+    # ERROR HANDLING
+    # =========================================================================
+
+    async def _on_error_event(self, event: Dict[str, Any], on_audio_delta: Callable, on_event: Callable):  # noqa: ARG002
+        logger.error("OpenAI API Error: %s", event)
+        await on_event({
+            "type": "error",
+            "error": event.get("error", {})
+        })
+
     async def _handle_function_call(self, event: Dict[str, Any], on_event: Callable):  # noqa: ARG002
         """
         Handle function calls from OpenAI.
@@ -294,16 +356,19 @@ Keep it under 10 seconds."""
             name = event.get("name")
             arguments = event.get("arguments", "{}")
 
-            logger.info(f"Function call: {name}")
-            logger.info(f"Arguments: {arguments}")
+            logger.info("Function call: %s", name)
+            logger.debug("Arguments: %s", arguments)
 
             # Parse arguments
-            args = json.loads(arguments) if arguments else {}
+            args = orjson.loads(arguments) if arguments else {}
 
             # Execute function
             if name in FUNCTION_MAP:
-                result = FUNCTION_MAP[name](**args)
-                logger.info(f"Function result: {result}")
+                result = FUNCTION_MAP[name](
+                    self.session_state,
+                    **{k: args[k] for k in FUNCTION_ARGS[name] if k in args}
+                )
+                logger.debug("Function result: %s", result)
 
                 # ==========================================================
                 # CRITICAL: Emit UI update to frontend
@@ -319,41 +384,24 @@ Keep it under 10 seconds."""
                         "success": result.get("success", True)
                     }
                     await self._on_ui_update(ui_update)
-                    logger.info(f"UI update emitted: {ui_update['action']}")
+                    logger.info("UI update emitted: %s", ui_update["action"])
 
                 # Send result back to OpenAI for voice response generation
-                function_output = {
-                    "type": "conversation.item.create",
-                    "item": {
-                        "type": "function_call_output",
-                        "call_id": call_id,
-                        "output": json.dumps(result)
-                    }
-                }
-
-                await self.ws.send(json.dumps(function_output))
+                await self.ws.send(_function_output_frame(call_id, result))
 
                 # Trigger OpenAI to generate voice response based on result
-                await self.ws.send(json.dumps({"type": "response.create"}))
+                await self.ws.send(_RESPONSE_CREATE_FRAME)
 
             else:
-                logger.error(f"Unknown function: {name}")
+                logger.error("Unknown function: %s", name)
                 # Send error result
-                function_output = {
-                    "type": "conversation.item.create",
-                    "item": {
-                        "type": "function_call_output",
-                        "call_id": call_id,
-                        "output": json.dumps({"error": f"Unknown function: {name}"})
-                    }
-                }
-                await self.ws.send(json.dumps(function_output))
-                await self.ws.send(json.dumps({"type": "response.create"}))
+                await self.ws.send(_function_output_frame(call_id, {"error": f"Unknown function: {name}"}))
+                await self.ws.send(_RESPONSE_CREATE_FRAME)
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing function arguments: {e}")
+        except orjson.JSONDecodeError as e:
+            logger.error("Error parsing function arguments: %s", e)
         except Exception as e:
-            logger.error(f"Error handling function call: {e}")
+            logger.error("Error handling function call: %s", e)
 
     async def disconnect(self):
         """Disconnect from OpenAI Realtime API"""
@@ -5,9 +5,12 @@ This module defines the tools (functions) that OpenAI can call during voice inte
 The key principle: these tools call the SAME search_products function used by HTTP API.
 """
 
-from typing import Dict, Any, Optional, List, Callable
+from typing import Dict, Any, Optional, List, Callable, Collection, Tuple
 from products import search_products, get_product_by_index, get_product_by_id, PRODUCTS
 
+# Lower-cased catalog names, parallel to PRODUCTS, for name lookups
+_NAMES_LOWER = tuple(p["name"].lower() for p in PRODUCTS)
+
 # =============================================================================
 # TOOL DEFINITIONS (OpenAI Function Calling Schema)
 # =============================================================================
@@ -162,25 +165,35 @@ Use when the user wants to:
 
 # =============================================================================
 # STATE MANAGEMENT
-# Storage for last shown products (for follow-up queries)
+# Storage for last shown products (for follow-up queries). Each RealtimeClient
+# owns one SessionState and passes it as the first argument to every handler.
 # =============================================================================
 
 class SessionState:
     """Manages state for voice sessions to handle follow-up queries"""
 
+    __slots__ = ("_last_products", "_last_names_lower", "_last_filters")
+
     def __init__(self):
         self._last_products: List[Dict[str, Any]] = []
+        self._last_names_lower: List[str] = []
         self._last_filters: Dict[str, Any] = {}
 
     def set_products(self, products: List[Dict[str, Any]], filters: Dict[str, Any]):
         """Store the last shown products for follow-up queries"""
         self._last_products = products
+        # Lower-cased once here rather than on every follow-up by name
+        self._last_names_lower = [p["name"].lower() for p in products]
         self._last_filters = filters
 
     def get_last_products(self) -> List[Dict[str, Any]]:
         """Get the last shown products"""
         return self._last_products
 
+    def get_last_names_lower(self) -> List[str]:
+        """Get the lower-cased names of the last shown products"""
+        return self._last_names_lower
+
     def get_last_filters(self) -> Dict[str, Any]:
         """Get the last applied filters"""
         return self._last_filters
@@ -188,11 +201,37 @@ class SessionState:
     def clear(self):
         """Clear session state"""
         self._last_products = []
+        self._last_names_lower = []
         self._last_filters = {}
 
 
-# Global session state (per-connection state should be managed by RealtimeClient)
-_session_state = SessionState()
+# =============================================================================
+# PRODUCT LOOKUP HELPERS
+# Shared by the handlers that resolve "the second one" / "the iPhone"
+# =============================================================================
+
+def _resolve_by_position(state: SessionState, position: int) -> Optional[Dict[str, Any]]:
+    """Product at a 1-based position in the last shown list, or in the catalog if nothing was shown"""
+    return get_product_by_index(state.get_last_products() or PRODUCTS, position)
+
+
+def _resolve_by_name(
+    state: SessionState,
+    name_lower: str,
+    exclude_ids: Collection[str] = ()
+) -> Optional[Dict[str, Any]]:
+    """First product whose name contains name_lower, checking last shown products before the catalog"""
+    last_shown = zip(state.get_last_names_lower(), state.get_last_products())
+    product = next(
+        (p for n, p in last_shown if name_lower in n and p["id"] not in exclude_ids),
+        None
+    )
+    if product is None:
+        product = next(
+            (p for n, p in zip(_NAMES_LOWER, PRODUCTS) if name_lower in n and p["id"] not in exclude_ids),
+            None
+        )
+    return product
 
 
 # =============================================================================
@@ -200,13 +239,13 @@ _session_state = SessionState()
 # =============================================================================
 
 def handle_search_products(
+    state: SessionState,
     query: Optional[str] = None,
     category: Optional[str] = None,
     min_price: Optional[int] = None,
     max_price: Optional[int] = None,
     brand: Optional[str] = None,
-    sort_by: str = "relevance",
-    **kwargs  # Catch any extra args
+    sort_by: str = "relevance"
 ) -> Dict[str, Any]:
     """
     Handle search_products function call from OpenAI.
@@ -228,7 +267,7 @@ def handle_search_products(
 
     # Store products for follow-up queries
     if result["success"]:
-        _session_state.set_products(
+        state.set_products(
             result["data"]["products"],
             result["data"]["filters_applied"]
         )
@@ -244,9 +283,9 @@ def handle_search_products(
 
 
 def handle_get_product_details(
+    state: SessionState,
     position: Optional[int] = None,
-    product_name: Optional[str] = None,
-    **kwargs
+    product_name: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Handle get_product_details function call from OpenAI.
@@ -254,31 +293,14 @@ def handle_get_product_details(
     """
 
     product = None
-    last_products = _session_state.get_last_products()
 
     # Try to find by position in last shown products
     if position is not None:
-        if last_products:
-            product = get_product_by_index(last_products, position)
-        else:
-            # No products shown yet, search all products
-            if 1 <= position <= len(PRODUCTS):
-                product = PRODUCTS[position - 1]
+        product = _resolve_by_position(state, position)
 
     # Try to find by name
     elif product_name:
-        name_lower = product_name.lower()
-        # First try in last shown products
-        for p in last_products:
-            if name_lower in p["name"].lower():
-                product = p
-                break
-        # If not found, try all products
-        if not product:
-            for p in PRODUCTS:
-                if name_lower in p["name"].lower():
-                    product = p
-                    break
+        product = _resolve_by_name(state, product_name.lower())
 
     if product:
         return {
@@ -301,9 +323,9 @@ def handle_get_product_details(
 
 
 def handle_compare_products(
+    state: SessionState,
     positions: Optional[List[int]] = None,
-    product_names: Optional[List[str]] = None,
-    **kwargs
+    product_names: Optional[List[str]] = None
 ) -> Dict[str, Any]:
     """
     Handle compare_products function call from OpenAI.
@@ -311,36 +333,23 @@ def handle_compare_products(
     """
 
     products_to_compare = []
-    last_products = _session_state.get_last_products()
+    seen_ids = set()
 
     # Find by positions
     if positions:
         for pos in positions:
-            if last_products:
-                product = get_product_by_index(last_products, pos)
-            else:
-                product = PRODUCTS[pos - 1] if 1 <= pos <= len(PRODUCTS) else None
-
-            if product and product not in products_to_compare:
+            product = _resolve_by_position(state, pos)
+            if product and product["id"] not in seen_ids:
+                seen_ids.add(product["id"])
                 products_to_compare.append(product)
 
-    # Find by names
+    # Find by names (skipping products already picked)
     if product_names:
         for name in product_names:
-            name_lower = name.lower()
-            # Search in last products first
-            found = False
-            for p in last_products:
-                if name_lower in p["name"].lower() and p not in products_to_compare:
-                    products_to_compare.append(p)
-                    found = True
-                    break
-            # Search all products if not found
-            if not found:
-                for p in PRODUCTS:
-                    if name_lower in p["name"].lower() and p not in products_to_compare:
-                        products_to_compare.append(p)
-                        break
+            product = _resolve_by_name(state, name.lower(), seen_ids)
+            if product:
+                seen_ids.add(product["id"])
+                products_to_compare.append(product)
 
     if len(products_to_compare) >= 2:
         return {
@@ -362,9 +371,9 @@ def handle_compare_products(
 
 
 def handle_add_to_cart(
+    state: SessionState,
     position: Optional[int] = None,
-    product_name: Optional[str] = None,
-    **kwargs
+    product_name: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Handle add_to_cart function call from OpenAI.
@@ -372,28 +381,14 @@ def handle_add_to_cart(
     """
 
     product = None
-    last_products = _session_state.get_last_products()
 
     # Find by position
     if position is not None:
-        if last_products:
-            product = get_product_by_index(last_products, position)
-        else:
-            if 1 <= position <= len(PRODUCTS):
-                product = PRODUCTS[position - 1]
+        product = _resolve_by_position(state, position)
 
     # Find by name
     elif product_name:
-        name_lower = product_name.lower()
-        for p in last_products:
-            if name_lower in p["name"].lower():
-                product = p
-                break
-        if not product:
-            for p in PRODUCTS:
-                if name_lower in p["name"].lower():
-                    product = p
-                    break
+        product = _resolve_by_name(state, product_name.lower())
 
     if product:
         if not product.get("in_stock", True):
@@ -421,37 +416,46 @@ def handle_add_to_cart(
         }
 
 
-def handle_navigate_to_page(page: str, **kwargs) -> Dict[str, Any]:
+_PAGE_ROUTES: Dict[str, str] = {
+    "home": "/",
+    "products": "/products",
+    "profile": "/profile",
+    "cart": "/cart",
+    "checkout": "/checkout"
+}
+
+# Navigation results never vary per call, so they're built once and shared.
+# Callers must treat them as read-only.
+_NAV_RESULTS: Dict[str, Dict[str, Any]] = {
+    page: {
+        "success": True,
+        "data": {
+            "page": page,
+            "route": route
+        },
+        "ui_action": {
+            "type": "NAVIGATE",
+            "navigate_to": route
+        }
+    }
+    for page, route in _PAGE_ROUTES.items()
+}
+
+
+def handle_navigate_to_page(state: SessionState, page: str) -> Dict[str, Any]:  # noqa: ARG001
     """
     Handle navigation requests from voice commands.
     """
 
-    page_routes = {
-        "home": "/",
-        "products": "/products",
-        "profile": "/profile",
-        "cart": "/cart",
-        "checkout": "/checkout"
-    }
-
-    if page not in page_routes:
+    result = _NAV_RESULTS.get(page)
+    if result is None:
         return {
             "success": False,
             "error": f"Unknown page: {page}",
             "ui_action": {"type": "NO_ACTION"}
         }
 
-    return {
-        "success": True,
-        "data": {
-            "page": page,
-            "route": page_routes[page]
-        },
-        "ui_action": {
-            "type": "NAVIGATE",
-            "navigate_to": page_routes[page]
-        }
-    }
+    return result
 
 
 # =============================================================================
@@ -466,16 +470,8 @@ FUNCTION_MAP: Dict[str, Callable] = {
     "navigate_to_page": handle_navigate_to_page
 }
 
-
-# =============================================================================
-# HELPER FUNCTIONS
-# =============================================================================
-
-def get_session_state() -> SessionState:
-    """Get the current session state"""
-    return _session_state
-
-
-def reset_session_state():
-    """Reset the session state (call on new connection)"""
-    _session_state.clear()
+# Argument names each function accepts, straight from its schema. The caller
+# drops anything else the model sends, so handlers don't need **kwargs.
+FUNCTION_ARGS: Dict[str, Tuple[str, ...]] = {
+    tool["name"]: tuple(tool["parameters"]["properties"]) for tool in TOOLS
+}